@@ -12,31 +12,93 @@ in a subsequent step.
 
 from __future__ import annotations
 
+import codecs
+import functools
+import hashlib
+import importlib
+import multiprocessing
+import os
 import pathlib
-from typing import Literal, Sequence, cast, Any, TYPE_CHECKING
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, Literal, Sequence, cast, Any, TYPE_CHECKING
 
 import base64
 from io import BytesIO
 
-from llm import get_llm
+from llm import DEFAULT_MAX_OUTPUT_TOKENS, context_window, count_tokens, get_llm
 from langchain_core.messages import HumanMessage, SystemMessage
 
-# Optional dependencies for OCR of images inside PDFs
-try:
-    from pdf2image import convert_from_path  # type: ignore
-except ImportError:  # pragma: no cover
-    convert_from_path = None  # type: ignore[assignment]
+# Optional dependencies (pdf2image / pytesseract for OCR and page images,
+# PyMuPDF / PyPDF2 for text extraction) are imported lazily on first use so
+# that importing this module – which Streamlit does on every rerun – stays
+# cheap.  A missing dependency resolves to ``None``.
+
+
+@functools.lru_cache(maxsize=None)
+def _optional_import(module: str) -> Any | None:
+    """Import and return *module*, or ``None`` if it isn't installed."""
+    try:
+        return importlib.import_module(module)
+    except ImportError:  # pragma: no cover
+        return None
+
+
+# Root directory for on-disk caches (extracted PDF text, etc.).
+_CACHE_DIR = pathlib.Path(
+    os.getenv("FINDER_CACHE_DIR", pathlib.Path.home() / ".cache" / "finder")
+)
+
+# Upper cap on characters of PDF text / raw data spliced into the prompt when
+# the budget is derived from the model's context window (keeps prefill cost
+# bounded on very large windows).
+_DEFAULT_MAX_RAW_CHARS = 200_000
+
+# Conservative characters-per-token ratio used to turn a token budget into a
+# character budget, and the tokens reserved for the fixed prompt text and
+# file markers.
+_CHARS_PER_TOKEN = 3
+_PROMPT_OVERHEAD_TOKENS = 600
+
+# Chunk size handed to the small model when summarising oversized raw data.
+_SUMMARY_CHUNK_CHARS = 50_000
+
+# Output caps for summary calls.  The per-call cap is rounded up to one of
+# these so summarisation reuses a couple of cached clients instead of creating
+# (and evicting the diagnosis model's) one per budget.
+_SUMMARY_OUTPUT_TOKEN_BUCKETS = (2048, 16384)
 
-try:
-    import pytesseract  # type: ignore
-except ImportError:  # pragma: no cover
-    pytesseract = None  # type: ignore
+# Rendering settings for page images attached to vision-model prompts.
+_PAGE_IMAGE_DPI = 150
+_PAGE_IMAGE_MAX_SIDE = 1600
+_PAGE_IMAGE_JPEG_QUALITY = 85
 
-# PDF text extraction dependency
-try:
-    from PyPDF2 import PdfReader  # type: ignore
-except ImportError:  # pragma: no cover
-    PdfReader = None  # type: ignore[assignment]
+# Timeout (seconds) per page for a batched Tesseract call before falling back
+# to per-page OCR.
+_OCR_TIMEOUT_PER_PAGE = 60
+
+# Start method for the OCR process pool – "forkserver" where supported (POSIX),
+# otherwise "spawn".  Plain fork is unsafe once other threads are running.
+_OCR_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# Prompts built at once by :func:`diagnose_many`.  Each build may start an OCR
+# pool and a Poppler render sized to every CPU, so more only oversubscribes.
+_MAX_CONCURRENT_BUILDS = 2
+
+# Block size for streaming reads of raw diagnostic files.
+_READ_BLOCK_BYTES = 1 << 20
+
+# Leading ISO-8601 timestamp (optionally bracketed) on a log line.
+_LEADING_TIMESTAMP_RE = re.compile(
+    r"^\s*\[?\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?\]?\s*"
+)
+
+# Pages whose embedded text layer is shorter than this are treated as scanned
+# and sent through OCR.
+_MIN_TEXT_LAYER_CHARS = 50
 
 
 # ---------------------------------------------------------------------------
@@ -44,35 +106,214 @@ except ImportError:  # pragma: no cover
 # ---------------------------------------------------------------------------
 
 
-def _extract_ocr_text(pdf_path: str | pathlib.Path) -> str:
-    """Return text extracted via OCR from images in the PDF.
+def _ocr_one(image_path: str) -> str | None:
+    """Run Tesseract on a single rendered page image.
 
-    This requires both *pdf2image* (to render PDF pages as images) and
-    *pytesseract* (to perform OCR).  If either dependency is missing or an
-    error occurs, an empty string is returned.
+    Defined at module level so it can be pickled and dispatched to worker
+    processes.  Errors are swallowed and reported as ``None`` (as opposed to
+    ``""`` for a page that genuinely contains no text).
     """
-    if convert_from_path is None or pytesseract is None:
-        return ""
+    try:
+        import pytesseract  # type: ignore
+
+        return pytesseract.image_to_string(image_path).strip()
+    except Exception:
+        return None
+
+
+def _init_ocr_worker() -> None:
+    """Limit each pooled Tesseract process to a single OpenMP thread.
+
+    Parallelism comes from the process pool; letting every Tesseract instance
+    also spawn one thread per core would oversubscribe the CPU.
+    """
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_batch(image_paths: Sequence[str | None]) -> list[str | None]:
+    """Run Tesseract once over several rendered page images via a list file.
+
+    Tesseract accepts a text file listing image paths, which amortises its
+    start-up cost across pages; its plain-text output separates pages with
+    form feeds.  If the batch call fails or the page count doesn't match, each
+    page is OCR'd individually with :func:`_ocr_one`.  ``None`` entries (pages
+    that failed to render) and pages that failed OCR yield ``None``.  The
+    result is aligned with *image_paths*.
+    """
+    indices = [idx for idx, path in enumerate(image_paths) if path]
+    texts: list[str | None] = [None] * len(image_paths)
+    if not indices:
+        return texts
+    if len(indices) == 1:
+        texts[indices[0]] = _ocr_one(cast(str, image_paths[indices[0]]))
+        return texts
 
     try:
-        images = convert_from_path(str(pdf_path), fmt="png")
+        import pytesseract  # type: ignore
+
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", prefix="finder_ocr_", suffix=".txt", delete=False
+        ) as list_file:
+            list_file.write("\n".join(cast(str, image_paths[idx]) for idx in indices) + "\n")
+        try:
+            output = pytesseract.image_to_string(
+                list_file.name, timeout=_OCR_TIMEOUT_PER_PAGE * len(indices)
+            )
+        finally:
+            os.unlink(list_file.name)
+        batch_texts = output.split("\f")
+        # Tesseract terminates every page with a form feed → trailing empty chunk.
+        if batch_texts and not batch_texts[-1].strip():
+            batch_texts = batch_texts[:-1]
+        if len(batch_texts) != len(indices):
+            raise ValueError("page count mismatch in batched OCR output")
     except Exception:
-        return ""
+        for idx in indices:
+            texts[idx] = _ocr_one(cast(str, image_paths[idx]))
+        return texts
+
+    for idx, text in zip(indices, batch_texts):
+        texts[idx] = text.strip()
+    return texts
+
+
+def _page_runs(page_numbers: Sequence[int]) -> list[tuple[int, int]]:
+    """Group zero-based *page_numbers* into inclusive ``(first, last)`` runs."""
+    runs: list[tuple[int, int]] = []
+    for num in page_numbers:
+        if runs and num == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], num)
+        else:
+            runs.append((num, num))
+    return runs
+
 
-    ocr_chunks: list[str] = []
-    for img in images:
+def _render_pages(
+    pdf_path: str | pathlib.Path,
+    page_numbers: Sequence[int] | None,
+    output_folder: str | pathlib.Path,
+    *,
+    thread_count: int,
+) -> list[str | None]:
+    """Render PDF pages to PNG files in *output_folder* and return their paths.
+
+    Poppler's threads write the files directly, so no page is decoded or
+    re-encoded in this process.  When *page_numbers* is given, the result is
+    aligned with it (``None`` for pages that failed to render); otherwise every
+    page of the document is rendered.
+    """
+    from pdf2image import convert_from_path  # type: ignore
+
+    options: dict[str, Any] = {
+        "fmt": "png",
+        "thread_count": thread_count,
+        "output_folder": str(output_folder),
+        "paths_only": True,
+    }
+    if page_numbers is None:
         try:
-            text = pytesseract.image_to_string(img)
+            return list(convert_from_path(str(pdf_path), **options))
         except Exception:
-            text = ""
-        if text:
-            ocr_chunks.append(text.strip())
+            return []
+
+    paths: list[str | None] = []
+    for first, last in _page_runs(page_numbers):
+        try:
+            paths.extend(
+                convert_from_path(
+                    str(pdf_path), first_page=first + 1, last_page=last + 1, **options
+                )
+            )
+        except Exception:
+            paths.extend([None] * (last - first + 1))
+    return paths
+
+
+def _ocr_pages(
+    pdf_path: str | pathlib.Path,
+    page_numbers: Sequence[int] | None = None,
+) -> list[str | None]:
+    """Return OCR text per page, aligned with *page_numbers* (or all pages).
+
+    Pages are rendered straight to PNG files by Poppler's own thread pool, split
+    into one batch per CPU and OCR'd in parallel across processes (Tesseract is
+    CPU-bound per page).  Pages that fail to render or OCR yield ``None``; an
+    empty list means OCR is unavailable or the document could not be rendered.
+    """
+    if _optional_import("pdf2image") is None or _optional_import("pytesseract") is None:
+        return []
+
+    if page_numbers is not None:
+        page_numbers = sorted(page_numbers)
+        if not page_numbers:
+            return []
+
+    workers = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory(prefix="finder_ocr_") as tmp:
+        image_paths = _render_pages(pdf_path, page_numbers, tmp, thread_count=workers)
+        return _ocr_rendered(image_paths, workers)
 
-    return "\n\n".join(ocr_chunks)
 
+def _ocr_rendered(image_paths: list[str | None], workers: int) -> list[str | None]:
+    """OCR rendered page files, in parallel batches when there are several."""
+    if len(image_paths) <= 1 or workers == 1:
+        return _ocr_batch(image_paths)
 
-def _extract_pdf_page_images(pdf_path: str | pathlib.Path, *, max_pages: int | None = None) -> list[str]:
-    """Render each PDF page to a PNG data-URL string for Gemini vision models.
+    # One contiguous batch per worker: each Tesseract start-up is amortised over
+    # its batch, and concatenating the batches preserves page order.  Workers
+    # receive file paths only, so nothing but short strings crosses processes.
+    n_batches = min(workers, len(image_paths))
+    size, extra = divmod(len(image_paths), n_batches)
+    batches: list[list[str | None]] = []
+    start = 0
+    for i in range(n_batches):
+        end = start + size + (1 if i < extra else 0)
+        batches.append(image_paths[start:end])
+        start = end
+
+    try:
+        # This may run in a worker thread (see _build_messages) alongside other
+        # live threads, so avoid fork(): forkserver children start clean.
+        with ProcessPoolExecutor(
+            max_workers=n_batches,
+            mp_context=multiprocessing.get_context(_OCR_START_METHOD),
+            initializer=_init_ocr_worker,
+        ) as executor:
+            results = list(executor.map(_ocr_batch, batches, chunksize=1))
+    except Exception:
+        # Process pools can fail in restricted environments – fall back to serial OCR.
+        return _ocr_batch(image_paths)
+
+    return [text for batch in results for text in batch]
+
+
+def _extract_ocr_text(
+    pdf_path: str | pathlib.Path,
+    page_numbers: Sequence[int] | None = None,
+) -> str:
+    """Return text extracted via OCR from images in the PDF.
+
+    This requires both *pdf2image* (to render PDF pages as images) and
+    *pytesseract* (to perform OCR).  If either dependency is missing or an
+    error occurs, an empty string is returned.
+
+    *page_numbers* (zero-based) restricts OCR to the given pages; by default
+    every page is processed.  Page order is preserved in the output.
+    """
+    return "\n\n".join(text for text in _ocr_pages(pdf_path, page_numbers) if text)
+
+
+def _extract_pdf_page_images(
+    pdf_path: str | pathlib.Path, *, max_pages: int | None = None
+) -> Iterator[str]:
+    """Render each PDF page to a JPEG data-URL string for Gemini vision models.
+
+    Pages are rendered at a moderate DPI, downscaled to fit within
+    ``_PAGE_IMAGE_MAX_SIDE`` pixels and JPEG-encoded, which keeps the upload
+    several times smaller than full-resolution PNGs.  All pages are rendered
+    by a single Poppler call into a temporary folder; they are then opened,
+    encoded and released one at a time, so peak memory stays at roughly one
+    page regardless of document length.
 
     Parameters
     ----------
@@ -81,120 +322,413 @@ def _extract_pdf_page_images(pdf_path: str | pathlib.Path, *, max_pages: int | N
     max_pages : int | None, optional
         Optional limit on the number of pages converted (to respect API payload limits).
 
-    Returns
-    -------
-    list[str]
-        A list of ``data:image/png;base64,...`` strings – one for each rendered page.
+    Yields
+    ------
+    str
+        A ``data:image/jpeg;base64,...`` string for each successfully rendered page.
     """
-    if convert_from_path is None:
+    pdf2image = _optional_import("pdf2image")
+    if pdf2image is None:
         # pdf2image missing → cannot extract page images.
-        return []
+        return
+
+    from PIL import Image  # type: ignore
 
+    with tempfile.TemporaryDirectory(prefix="finder_pages_") as tmp:
+        try:
+            page_paths = pdf2image.convert_from_path(
+                str(pdf_path),
+                # Lossless render; the only lossy step is the final JPEG encode.
+                fmt="ppm",
+                dpi=_PAGE_IMAGE_DPI,
+                # Don't render pages we're going to drop anyway.
+                last_page=max_pages,
+                output_folder=tmp,
+                paths_only=True,
+            )
+        except Exception:
+            return
+
+        for page_path in sorted(page_paths)[:max_pages]:
+            buffer = BytesIO()
+            try:
+                with Image.open(page_path) as img:
+                    img.thumbnail((_PAGE_IMAGE_MAX_SIDE, _PAGE_IMAGE_MAX_SIDE))
+                    rgb = img if img.mode in ("RGB", "L") else img.convert("RGB")
+                    rgb.save(buffer, format="JPEG", quality=_PAGE_IMAGE_JPEG_QUALITY, optimize=True)
+            except Exception:
+                # Skip problematic pages but continue processing others.
+                continue
+            finally:
+                pathlib.Path(page_path).unlink(missing_ok=True)
+            encoded = base64.b64encode(buffer.getvalue()).decode()
+            yield f"data:image/jpeg;base64,{encoded}"
+
+
+def _page_image_parts(pdf_path: str | pathlib.Path, *, max_pages: int | None = None) -> list[Any]:
+    """Return multimodal content parts (delimited page images) for *pdf_path*.
+
+    Consumes :func:`_extract_pdf_page_images` page by page, so only the
+    encoded data URLs – which end up in the prompt anyway – are retained.
+    """
+    parts: list[Any] = []
+    for idx, data_url in enumerate(_extract_pdf_page_images(pdf_path, max_pages=max_pages), start=1):
+        # Provide clear delimiters so the model knows the source page.
+        parts.append({"type": "text", "text": f"----- PDF PAGE {idx} IMAGE START -----"})
+        parts.append({"type": "image_url", "image_url": data_url})
+        parts.append({"type": "text", "text": f"----- PDF PAGE {idx} IMAGE END -----"})
+    return parts
+
+
+def _pypdf2_page_may_have_text(page: Any) -> bool:
+    """Return ``False`` for PyPDF2 pages that cannot carry a text layer.
+
+    A page with no content stream, or whose resources define no fonts and no
+    form XObjects (the typical scanned page: a single image), has nothing for
+    ``extract_text`` to find, so its comparatively expensive parse is skipped.
+    When in doubt ``True`` is returned.
+    """
     try:
-        images = convert_from_path(str(pdf_path), fmt="png", dpi=200)
+        if page.get("/Contents") is None:
+            return False
+        resources = page.get("/Resources")
+        if resources is None:
+            return True
+        resources = resources.get_object()
+        if resources.get("/Font"):
+            return True
+        xobjects = resources.get("/XObject")
+        if xobjects:
+            for xobj in xobjects.get_object().values():
+                # Form XObjects can draw text with their own font resources.
+                if xobj.get_object().get("/Subtype") == "/Form":
+                    return True
+        return False
     except Exception:
-        return []
+        return True
 
-    if max_pages is not None:
-        images = images[: max_pages]
 
-    data_urls: list[str] = []
-    for img in images:
-        buffer = BytesIO()
+def _extract_page_texts(pdf_path: str | pathlib.Path) -> list[str]:
+    """Return the embedded text layer of *pdf_path*, one string per page.
+
+    PyMuPDF (``fitz``) is used when available; PyPDF2 is the fallback.  If
+    neither library can parse the file, an empty list is returned.
+    """
+    fitz = _optional_import("fitz")
+    if fitz is not None:
         try:
-            img.save(buffer, format="PNG")
-            encoded = base64.b64encode(buffer.getvalue()).decode()
-            data_urls.append(f"data:image/png;base64,{encoded}")
+            with fitz.open(str(pdf_path)) as doc:
+                return [page.get_text("text") or "" for page in doc]
         except Exception:
-            # Skip problematic pages but continue processing others.
-            continue
+            pass
+
+    pypdf2 = _optional_import("PyPDF2")
+    if pypdf2 is not None:
+        try:
+            reader = pypdf2.PdfReader(str(pdf_path), strict=False)
+            return [
+                (page.extract_text() or "") if _pypdf2_page_may_have_text(page) else ""
+                for page in reader.pages
+            ]
+        except Exception:
+            pass
 
-    return data_urls
+    return []
 
 
-def _extract_pdf_text(pdf_path: str | pathlib.Path) -> str:
-    """Return all textual contents extracted from *pdf_path*.
+def _file_digest(path: str | pathlib.Path) -> str:
+    """Return a BLAKE2b hex digest of the file contents at *path*."""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pdf_text_signature() -> str:
+    """Describe the extraction setup whose output the PDF text cache stores.
 
-    If PyPDF2 is unavailable or the file cannot be parsed, an empty string is
-    returned so the analysis can proceed (the raw data may still be useful).
+    Included in the cache key so installing (or removing) PyMuPDF / OCR
+    support, or changing the text-layer threshold, never serves text that
+    the current environment would extract differently.
     """
-    if PdfReader is None:
-        text_content = ""
+    if _optional_import("fitz") is not None:
+        extractor = "fitz"
+    elif _optional_import("PyPDF2") is not None:
+        extractor = "pypdf2"
     else:
-        try:
-            reader = PdfReader(str(pdf_path))
-            text_content = "\n\n".join(
-                page.extract_text() or "" for page in reader.pages
-            )
-        except Exception:
-            text_content = ""
+        extractor = "none"
+    ocr = _optional_import("pdf2image") is not None and _optional_import("pytesseract") is not None
+    return f"{extractor}-ocr{int(ocr)}-min{_MIN_TEXT_LAYER_CHARS}"
+
+
+def _extract_pdf_text(pdf_path: str | pathlib.Path) -> str:
+    """Return all textual contents extracted from *pdf_path*, using a disk cache.
+
+    Results are stored under ``$FINDER_CACHE_DIR/pdf_text`` (default
+    ``~/.cache/finder/pdf_text``) keyed on a hash of the PDF bytes plus
+    :func:`_pdf_text_signature`, so re-analysing the same document skips
+    extraction and OCR entirely.  Incomplete results (pages that needed OCR
+    but could not get it) are not cached.  Cache failures are ignored and
+    never prevent extraction.
+    """
+    try:
+        key = f"{_file_digest(pdf_path)}-{_pdf_text_signature()}"
+        cache_path = _CACHE_DIR / "pdf_text" / f"{key}.txt"
+    except Exception:
+        return _extract_pdf_text_uncached(pdf_path)[0]
+
+    try:
+        return cache_path.read_text(encoding="utf-8")
+    except Exception:
+        pass
+
+    text, complete = _extract_pdf_text_uncached(pdf_path)
+    if not text or not complete:
+        # Don't cache failures or partial results – a later run may do better.
+        return text
 
-    # Attempt OCR on embedded images/pages for additional context
-    ocr_text = _extract_ocr_text(pdf_path)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a uniquely named temp file first so concurrent writers (threads
+        # included) never collide and readers never see partial output.
+        with tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            dir=cache_path.parent,
+            prefix=f".{cache_path.name}.",
+            suffix=".tmp",
+            delete=False,
+        ) as tmp:
+            tmp.write(text)
+        pathlib.Path(tmp.name).replace(cache_path)
+    except Exception:
+        pass
+
+    return text
 
-    if ocr_text:
-        return f"{text_content}\n\n{ocr_text}" if text_content else ocr_text
-    return text_content
+
+def _extract_pdf_text_uncached(pdf_path: str | pathlib.Path) -> tuple[str, bool]:
+    """Return all textual contents extracted from *pdf_path* and whether they are complete.
+
+    Only pages without a usable text layer (scanned pages, image-only slides)
+    are sent through OCR; born-digital pages use their embedded text as-is.
+    If no PDF library is available or the file cannot be parsed, the whole
+    document is OCR'd instead.  An empty string is returned if nothing could
+    be extracted, so the analysis can proceed (the raw data may still be
+    useful).  The flag is ``False`` when any page that needed OCR could not
+    be OCR'd (missing dependencies, render or Tesseract failures).
+    """
+    page_texts = _extract_page_texts(pdf_path)
+
+    if not page_texts:
+        ocr_texts = _ocr_pages(pdf_path)
+        complete = bool(ocr_texts) and all(text is not None for text in ocr_texts)
+        return "\n\n".join(text for text in ocr_texts if text), complete
+
+    needs_ocr = [
+        idx for idx, text in enumerate(page_texts) if len(text.strip()) < _MIN_TEXT_LAYER_CHARS
+    ]
+    ocr_texts = _ocr_pages(pdf_path, needs_ocr) if needs_ocr else []
+    complete = len(ocr_texts) == len(needs_ocr) and all(text is not None for text in ocr_texts)
+
+    merged = list(page_texts)
+    for idx, ocr_text in zip(needs_ocr, ocr_texts):
+        if ocr_text:
+            merged[idx] = f"{merged[idx].strip()}\n\n{ocr_text}" if merged[idx].strip() else ocr_text
+
+    return "\n\n".join(text for text in merged if text), complete
 
 
 def _read_raw_data(raw_path: str | pathlib.Path) -> str:
-    """Return the raw data as a UTF-8 string (falling back to Latin-1 on decode errors)."""
-    path = pathlib.Path(raw_path)
+    """Return the raw data as a UTF-8 string (undecodable bytes are replaced).
+
+    The file is read once in fixed-size blocks through an incremental decoder,
+    so multi-byte sequences split across blocks decode correctly and no second
+    pass over the file is ever needed.  Runs of repeated lines are then
+    collapsed by :func:`_compact_raw` to save prompt tokens.  Returns an empty
+    string if the file cannot be read.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts: list[str] = []
     try:
-        return path.read_text(encoding="utf-8", errors="replace")
+        with pathlib.Path(raw_path).open("rb") as fh:
+            for block in iter(lambda: fh.read(_READ_BLOCK_BYTES), b""):
+                parts.append(decoder.decode(block))
     except Exception:
-        # Last-ditch effort: read as bytes then decode.
-        try:
-            return path.read_bytes().decode("latin-1", errors="replace")
-        except Exception:
-            return ""
+        return ""
+    parts.append(decoder.decode(b"", final=True))
+    return _compact_raw("".join(parts))
 
 
-# ---------------------------------------------------------------------------
-# Public API
-# ---------------------------------------------------------------------------
+def _compact_raw(text: str) -> str:
+    """Collapse runs of repeated log lines into ``"<line> (×N)"``.
 
+    Lines are compared with any leading ISO-8601 timestamp removed, so
+    heartbeats or retry loops that differ only in their timestamp still
+    collapse.  The first line of each run is kept verbatim (timestamp
+    included) so the prompt still shows when the run started.
+    """
+    out: list[str] = []
+    run_first = ""
+    run_key: str | None = None
+    run_count = 0
 
-def diagnose_customer_issue(
-    pdf_path: str | pathlib.Path,
-    raw_data_path: str | pathlib.Path | Sequence[str | pathlib.Path],
-    *,
-    provider: Literal["vertex", "gemini_api", "openai"] | None = None,
-) -> str:
-    """Analyse the customer's issue based on the PDF description and raw diagnostic data.
+    def flush() -> None:
+        if run_key is not None:
+            out.append(f"{run_first} (×{run_count})" if run_count > 1 else run_first)
 
-    Parameters
-    ----------
-    pdf_path : str | pathlib.Path
-        Path to the PDF that summarises the customer's problem and potential causes.
-    raw_data_path : str | pathlib.Path
-        Path to a file containing low-level diagnostic information (format agnostic).
-    provider : str, optional
-        Force a specific LLM backend.  If omitted, falls back to environment defaults.
+    # Split on "\n" only: other line-break-like characters (\r, \f, \x1c, ...)
+    # and a trailing newline pass through unchanged.
+    for line in text.split("\n"):
+        key = _LEADING_TIMESTAMP_RE.sub("", line, count=1)
+        if key == run_key:
+            run_count += 1
+            continue
+        flush()
+        run_first, run_key, run_count = line, key, 1
+    flush()
 
-    Returns
-    -------
-    str
-        A thorough, human-readable explanation of *why* the customer is experiencing
-        the issue, including references to both the PDF content and the raw data.
+    return "\n".join(out)
+
+
+def _truncate_middle(text: str, max_chars: int | None) -> str:
+    """Clip *text* to about *max_chars* by keeping its head and tail.
+
+    Logs usually carry the interesting context at the start (setup) and end
+    (the failure), so the middle is replaced by an elision marker.
     """
-    pdf_text = _extract_pdf_text(pdf_path)
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    max_chars = max(max_chars, 0)
+    head = max_chars // 2
+    tail = max_chars - head
+    elided = len(text) - max_chars
+    return f"{text[:head]}\n\n... [{elided} chars elided] ...\n\n{text[len(text) - tail:]}"
+
+
+def _summarize_text(text: str, max_chars: int, provider: str | None) -> str:
+    """Condense *text* to about *max_chars* using the small model.
+
+    The text is split into chunks that are summarised concurrently (a simple
+    map step); the joined summaries are clipped with :func:`_truncate_middle`
+    as a safety net.  The output cap is sized to the per-chunk character
+    budget; a chunk whose summary comes back empty (Gemini's behaviour when
+    the cap is hit) is retried once uncapped and otherwise truncated.  Falls
+    back to plain truncation if the LLM call fails.
+    """
+    chunks = [
+        text[start : start + _SUMMARY_CHUNK_CHARS]
+        for start in range(0, len(text), _SUMMARY_CHUNK_CHARS)
+    ]
+    per_chunk_chars = max(max_chars // len(chunks), 500)
+    system_prompt = (
+        "You condense raw diagnostic data (logs, traces, dumps) for a support engineer. "
+        f"Summarise the excerpt in at most {per_chunk_chars} characters. Keep error messages, "
+        "stack traces, identifiers, versions and timestamps of notable events verbatim; "
+        "collapse repetitive lines into a single line with a count."
+    )
+    batch = [[SystemMessage(content=system_prompt), HumanMessage(content=chunk)] for chunk in chunks]
+    # ~4 characters per token, plus headroom so the summary isn't cut short,
+    # rounded up to a fixed bucket so every call shares a cached client.
+    needed = per_chunk_chars // 4 + 256
+    max_output_tokens = next(
+        (cap for cap in _SUMMARY_OUTPUT_TOKEN_BUCKETS if cap >= needed),
+        _SUMMARY_OUTPUT_TOKEN_BUCKETS[-1],
+    )
+
+    try:
+        llm = get_llm(provider=provider, size="small", max_output_tokens=max_output_tokens)  # type: ignore[arg-type]
+        responses = llm.batch(batch, config={"max_concurrency": 8})  # type: ignore[arg-type]
+
+        empty = [idx for idx, response in enumerate(responses) if _is_empty_response(response)]
+        if empty:
+            print(f"[LLM] {len(empty)} empty summary(ies) with max_output_tokens set; retrying without the cap.")
+            uncapped = get_llm(provider=provider, size="small", max_output_tokens=None)  # type: ignore[arg-type]
+            retries = uncapped.batch([batch[idx] for idx in empty], config={"max_concurrency": 8})  # type: ignore[arg-type]
+            for idx, response in zip(empty, retries):
+                responses[idx] = response
+    except Exception as exc:
+        print(f"[LLM] Summarisation failed ({exc}); falling back to truncation.")
+        return _truncate_middle(text, max_chars)
+
+    summaries = [
+        f"[Summary of part {idx}/{len(chunks)}]\n"
+        + (
+            _response_text(response)
+            if not _is_empty_response(response)
+            else _truncate_middle(chunk, per_chunk_chars)
+        )
+        for idx, (chunk, response) in enumerate(zip(chunks, responses), start=1)
+    ]
+    return _truncate_middle("\n\n".join(summaries), max_chars)
+
+
+def _prompt_char_budget(provider: str | None, max_output_tokens: int | None) -> int:
+    """Return how many characters of PDF text + raw data fit the model's window.
+
+    The context window of the resolved model, minus the fixed prompt overhead
+    and the output reservation, converted at ``_CHARS_PER_TOKEN``; capped at
+    twice ``_DEFAULT_MAX_RAW_CHARS`` overall so huge windows don't invite
+    equally huge (slow, costly) prompts.
+    """
+    reserved = _PROMPT_OVERHEAD_TOKENS + (max_output_tokens or DEFAULT_MAX_OUTPUT_TOKENS)
+    tokens = max(context_window(provider) - reserved, 0)  # type: ignore[arg-type]
+    return min(tokens * _CHARS_PER_TOKEN, 2 * _DEFAULT_MAX_RAW_CHARS)
+
+
+def _allocate_budget(
+    pdf_len: int,
+    raw_lens: Sequence[int],
+    max_raw_chars: int | None,
+    provider: str | None,
+    max_output_tokens: int | None,
+) -> tuple[int, list[int]]:
+    """Return character budgets ``(pdf_chars, [raw_file_chars, ...])``.
+
+    An explicit *max_raw_chars* caps the PDF text and the combined raw data at
+    that many characters each (split evenly across raw files).  Otherwise the
+    budget from :func:`_prompt_char_budget` is shared: the PDF text gets at
+    most half, raw files split the rest (short files hand their unused share
+    to longer ones), and any raw budget left over goes back to the PDF text.
+    """
+    n_files = max(len(raw_lens), 1)
+    if max_raw_chars is not None:
+        return max_raw_chars, [max_raw_chars // n_files] * len(raw_lens)
+
+    total = _prompt_char_budget(provider, max_output_tokens)
+    pdf_chars = min(pdf_len, total // 2)
+
+    remaining = total - pdf_chars
+    raw_chars = [0] * len(raw_lens)
+    order = sorted(range(len(raw_lens)), key=lambda i: raw_lens[i])
+    for k, idx in enumerate(order):
+        raw_chars[idx] = min(raw_lens[idx], remaining // (len(order) - k))
+        remaining -= raw_chars[idx]
+
+    pdf_chars = min(pdf_len, pdf_chars + remaining)
+    return pdf_chars, raw_chars
+
+
+def _join_raw_texts(
+    raw_data_path: str | pathlib.Path | Sequence[str | pathlib.Path],
+    raw_paths: Sequence[str | pathlib.Path],
+    raw_texts: Sequence[str],
+) -> str:
+    """Return the raw-data section, with per-file markers for multiple files."""
     # Support a single path or a list/tuple of paths for raw diagnostic files.
     if isinstance(raw_data_path, (list, tuple)):
         raw_parts: list[str] = []
-        for idx, path in enumerate(raw_data_path, start=1):
-            text = _read_raw_data(path)
+        for idx, (path, text) in enumerate(zip(raw_paths, raw_texts), start=1):
             raw_parts.append(
                 f"===== RAW FILE {idx} ({path}) START =====\n{text}\n===== RAW FILE {idx} END ====="
             )
-        raw_text = "\n\n".join(raw_parts)
-    else:
-        raw_text = _read_raw_data(cast(str | pathlib.Path, raw_data_path))
+        return "\n\n".join(raw_parts)
+    return raw_texts[0]
 
-    # ------------------------------------------------------------------
-    # Build prompts – handle Gemini vision models specially so we can attach images
-    # ------------------------------------------------------------------
 
+def _prompt_text(pdf_text: str, raw_text: str) -> tuple[str, str]:
+    """Return the ``(system_prompt, user_prompt)`` pair for a diagnosis."""
     system_prompt = (
         "You are a senior support engineer. A customer has provided a PDF describing "
         "their problem, as well as various hypotheses about what might be causing it. "
@@ -219,8 +753,45 @@ def diagnose_customer_issue(
         "state what additional data would help."
     )
 
-    llm = get_llm(provider=provider)
+    return system_prompt, user_prompt
+
+
+def _check_prompt_size(prompt: str, provider: str | None) -> None:
+    """Log the prompt's token count and raise if it exceeds the context window.
 
+    No-op when *tiktoken* isn't available.
+    """
+    prompt_tokens = count_tokens(prompt)
+    if prompt_tokens is None:
+        return
+    limit = context_window(provider)  # type: ignore[arg-type]
+    print(f"[LLM] Prompt size: {prompt_tokens} tokens (context window {limit}).")
+    if prompt_tokens > limit:
+        raise ValueError(
+            f"Prompt is {prompt_tokens} tokens, exceeding the {limit}-token context window; "
+            "lower max_raw_chars or enable summarize_overflow."
+        )
+
+
+def _build_messages(
+    pdf_path: str | pathlib.Path,
+    raw_data_path: str | pathlib.Path | Sequence[str | pathlib.Path],
+    llm: Any,
+    provider: str | None,
+    *,
+    max_raw_chars: int | None = None,
+    summarize_overflow: bool = False,
+    max_output_tokens: int | None = DEFAULT_MAX_OUTPUT_TOKENS,
+) -> list[Any]:
+    """Return the LangChain message list for a diagnosis request.
+
+    Gemini vision models receive a single multimodal ``HumanMessage`` with the
+    rendered PDF pages attached; other providers get a system + user pair.
+    The PDF text and raw files are clipped to the budgets from
+    :func:`_allocate_budget` to keep the prompt within context limits; with
+    *summarize_overflow*, oversized raw files are condensed by the small model
+    instead of being clipped.
+    """
     # Detect whether the selected LLM backend is Gemini *and* supports images.
     # We check either an explicit provider flag or the instantiated class name.
     if TYPE_CHECKING:
@@ -236,6 +807,57 @@ def diagnose_customer_issue(
         if llm.__class__.__name__ == "ChatGoogleGenerativeAI":
             using_gemini_vision = True
 
+    # PDF extraction (incl. OCR), page rendering and raw-file reads are
+    # independent, so run them concurrently; wall time ≈ the slowest task.
+    raw_paths: list[str | pathlib.Path] = (
+        list(raw_data_path)
+        if isinstance(raw_data_path, (list, tuple))
+        else [cast(str | pathlib.Path, raw_data_path)]
+    )
+    with ThreadPoolExecutor(max_workers=len(raw_paths) + 2) as executor:
+        pdf_future = executor.submit(_extract_pdf_text, pdf_path)
+        images_future = (
+            # Attach page images – limit to 16 to respect Gemini payload limits.
+            executor.submit(_page_image_parts, pdf_path, max_pages=16)
+            if using_gemini_vision
+            else None
+        )
+        raw_futures = [executor.submit(_read_raw_data, path) for path in raw_paths]
+
+        pdf_text = pdf_future.result()
+        raw_texts = [future.result() for future in raw_futures]
+
+        pdf_chars, raw_chars = _allocate_budget(
+            len(pdf_text),
+            [len(text) for text in raw_texts],
+            max_raw_chars,
+            provider,
+            max_output_tokens,
+        )
+        pdf_text = _truncate_middle(pdf_text, pdf_chars)
+        clipped = [_truncate_middle(text, budget) for text, budget in zip(raw_texts, raw_chars)]
+
+        # Fail fast – before any summarisation or diagnosis API call – if the
+        # prompt cannot fit the context window.  Summaries are held to the same
+        # per-file budgets, so the clipped texts bound the final prompt size.
+        system_prompt, user_prompt = _prompt_text(
+            pdf_text, _join_raw_texts(raw_data_path, raw_paths, clipped)
+        )
+        _check_prompt_size(f"{system_prompt}\n\n{user_prompt}", provider)
+
+        if summarize_overflow and any(len(text) > budget for text, budget in zip(raw_texts, raw_chars)):
+            summary_futures = {
+                idx: executor.submit(_summarize_text, text, budget, provider)
+                for idx, (text, budget) in enumerate(zip(raw_texts, raw_chars))
+                if len(text) > budget
+            }
+            for idx, future in summary_futures.items():
+                clipped[idx] = future.result()
+            system_prompt, user_prompt = _prompt_text(
+                pdf_text, _join_raw_texts(raw_data_path, raw_paths, clipped)
+            )
+        image_parts = images_future.result() if images_future is not None else []
+
     # Prepare placeholder for messages to avoid redefinition issues with static type checkers.
     messages: list[Any]
 
@@ -244,22 +866,15 @@ def diagnose_customer_issue(
         # Combine system + user text, then append images with page context.
         combined_text = f"{system_prompt}\n\n{user_prompt}"
 
-        content_parts: list[Any] = [{"type": "text", "text": combined_text}]
-
-        # Attach page images – limit to 16 to respect Gemini payload limits.
-        page_images = _extract_pdf_page_images(pdf_path, max_pages=16)
-        for idx, data_url in enumerate(page_images, start=1):
-            # Provide clear delimiters so the model knows the source page.
-            content_parts.append({"type": "text", "text": f"----- PDF PAGE {idx} IMAGE START -----"})
-            content_parts.append({"type": "image_url", "image_url": data_url})
-            content_parts.append({"type": "text", "text": f"----- PDF PAGE {idx} IMAGE END -----"})
+        content_parts: list[Any] = [{"type": "text", "text": combined_text}, *image_parts]
+        n_images = sum(1 for part in image_parts if part["type"] == "image_url")
 
         # Cast to satisfy strict typing – runtime will accept the structure.
         messages = [HumanMessage(content=content_parts)]  # type: ignore[arg-type]
 
         # Debug logging – show page markers so users see where images go.
         print("\n===== LLM PROMPT (COMBINED TEXT + IMAGE MARKERS) =====\n", combined_text, sep="")
-        print(f"\n[LLM] Attached {len(page_images)} page image(s). Markers are included in the prompt after the text block.")
+        print(f"\n[LLM] Attached {n_images} page image(s). Markers are included in the prompt after the text block.")
     else:
         # Original two-message flow for providers that do not support image input.
         messages = [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]  # type: ignore[arg-type]
@@ -268,16 +883,308 @@ def diagnose_customer_issue(
         print("\n===== LLM PROMPT (SYSTEM) =====\n", system_prompt, sep="")
         print("\n===== LLM PROMPT (USER) =====\n", user_prompt, sep="")
 
+    return messages
+
+
+def _response_text(response: Any) -> str:
+    """Return the text content of an LLM *response* (message object or str)."""
+    if isinstance(response, str):
+        return response
+    return str(getattr(response, "content", "")) or str(response)
+
+
+def _stream_cache_key(llm: Any, messages: list[Any]) -> tuple[Any, str, str] | None:
+    """Return ``(cache, prompt, llm_string)`` for *llm*'s global response cache.
+
+    ``BaseChatModel.stream`` bypasses the LLM cache that ``invoke``/``batch``
+    use, so streaming callers look it up themselves with the same key LangChain
+    would build.  Returns ``None`` when no cache is configured or the key
+    cannot be derived.
+    """
+    try:
+        from langchain_core.globals import get_llm_cache
+        from langchain_core.load import dumps
+
+        cache = get_llm_cache()
+        if cache is None:
+            return None
+        return cache, dumps(messages), llm._get_llm_string()
+    except Exception:
+        return None
+
+
+def _stream_text(llm: Any, messages: list[Any]) -> Iterator[str]:
+    """Yield (and echo) the non-empty text chunks streamed by *llm*.
+
+    A cached response for the same prompt/model is yielded in one piece
+    without calling the API; otherwise the completed stream is written to the
+    cache so the next identical request (e.g. a repeated "Diagnose" click)
+    is served from it.
+    """
+    cache_key = _stream_cache_key(llm, messages)
+    if cache_key is not None:
+        cache, prompt, llm_string = cache_key
+        try:
+            cached = cache.lookup(prompt, llm_string)
+        except Exception:
+            cached = None
+        if cached:
+            text = "".join(str(getattr(gen, "text", "")) for gen in cached)
+            if text:
+                print(text, end="", flush=True)
+                yield text
+                return
+
+    parts: list[str] = []
+    for chunk in llm.stream(messages):
+        text = chunk if isinstance(chunk, str) else getattr(chunk, "content", "")
+        if not isinstance(text, str):
+            text = str(text)
+        if text:
+            print(text, end="", flush=True)
+            parts.append(text)
+            yield text
+
+    if cache_key is not None and parts:
+        try:
+            from langchain_core.messages import AIMessage
+            from langchain_core.outputs import ChatGeneration
+
+            full_text = "".join(parts)
+            cache.update(prompt, llm_string, [ChatGeneration(message=AIMessage(content=full_text))])
+        except Exception:
+            pass
+
+
+def _is_empty_response(response: Any) -> bool:
+    """Return ``True`` if *response* carries no generated text.
+
+    Gemini returns empty content when a ``max_output_tokens`` cap is hit; callers
+    retry such responses once without the cap.
+    """
+    content = response if isinstance(response, str) else getattr(response, "content", "")
+    return not str(content).strip()
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+
+def cache_dir() -> pathlib.Path:
+    """Return the root directory for Finder's on-disk caches.
+
+    Defaults to ``~/.cache/finder``; override with ``FINDER_CACHE_DIR``.
+    """
+    return _CACHE_DIR
+
+
+def diagnose_customer_issue(
+    pdf_path: str | pathlib.Path,
+    raw_data_path: str | pathlib.Path | Sequence[str | pathlib.Path],
+    *,
+    provider: Literal["vertex", "gemini_api", "openai"] | None = None,
+    max_raw_chars: int | None = None,
+    summarize_overflow: bool = False,
+    max_output_tokens: int | None = DEFAULT_MAX_OUTPUT_TOKENS,
+) -> str:
+    """Analyse the customer's issue based on the PDF description and raw diagnostic data.
+
+    Parameters
+    ----------
+    pdf_path : str | pathlib.Path
+        Path to the PDF that summarises the customer's problem and potential causes.
+    raw_data_path : str | pathlib.Path
+        Path to a file containing low-level diagnostic information (format agnostic).
+    provider : str, optional
+        Force a specific LLM backend.  If omitted, falls back to environment defaults.
+    max_raw_chars : int | None, optional
+        Upper bound on characters of PDF text and of raw data embedded in the prompt.
+        Longer inputs keep their head and tail with the middle elided.  ``None``
+        (default) derives the budget from the model's context window, minus the
+        fixed prompt and output reservation, split between PDF text and raw data.
+    summarize_overflow : bool, optional
+        Condense raw files that exceed the budget with a small, cheap model instead
+        of eliding their middle.
+    max_output_tokens : int | None, optional
+        Cap on generated tokens (decode time grows linearly with output length).
+        If a capped call returns no text, it is retried once without the cap.
+
+    Returns
+    -------
+    str
+        A thorough, human-readable explanation of *why* the customer is experiencing
+        the issue, including references to both the PDF content and the raw data.
+    """
+    llm = get_llm(provider=provider, max_output_tokens=max_output_tokens)
+    messages = _build_messages(
+        pdf_path,
+        raw_data_path,
+        llm,
+        provider,
+        max_raw_chars=max_raw_chars,
+        summarize_overflow=summarize_overflow,
+        max_output_tokens=max_output_tokens,
+    )
+
     response = llm.invoke(messages)  # type: ignore[arg-type]
+    if max_output_tokens is not None and _is_empty_response(response):
+        print("[LLM] Empty response with max_output_tokens set; retrying without the cap.")
+        response = get_llm(provider=provider, max_output_tokens=None).invoke(messages)  # type: ignore[arg-type]
 
     # Extract text from response and log it
-    if isinstance(response, str):
-        content = response
-    else:
-        content = str(getattr(response, "content", "")) or str(response)
+    content = _response_text(response)
 
     # Print the raw response object for additional debugging
     print("\n===== LLM RAW OBJECT =====\n", repr(response), sep="")
     print("\n===== LLM RESPONSE =====\n", content, sep="")
 
     return content
+
+
+def diagnose_customer_issue_stream(
+    pdf_path: str | pathlib.Path,
+    raw_data_path: str | pathlib.Path | Sequence[str | pathlib.Path],
+    *,
+    provider: Literal["vertex", "gemini_api", "openai"] | None = None,
+    max_raw_chars: int | None = None,
+    summarize_overflow: bool = False,
+    max_output_tokens: int | None = DEFAULT_MAX_OUTPUT_TOKENS,
+) -> Iterator[str]:
+    """Streaming variant of :func:`diagnose_customer_issue`.
+
+    Yields the LLM's answer incrementally as text chunks arrive, so UIs can
+    render the first tokens immediately instead of waiting for the full
+    completion.  Parameters match :func:`diagnose_customer_issue`.
+
+    Yields
+    ------
+    str
+        Successive fragments of the diagnosis text.
+    """
+    llm = get_llm(provider=provider, max_output_tokens=max_output_tokens)
+    messages = _build_messages(
+        pdf_path,
+        raw_data_path,
+        llm,
+        provider,
+        max_raw_chars=max_raw_chars,
+        summarize_overflow=summarize_overflow,
+        max_output_tokens=max_output_tokens,
+    )
+
+    print("\n===== LLM RESPONSE (STREAMING) =====")
+    produced = False
+    for text in _stream_text(llm, messages):
+        produced = True
+        yield text
+
+    if not produced and max_output_tokens is not None:
+        print("[LLM] Empty response with max_output_tokens set; retrying without the cap.")
+        yield from _stream_text(get_llm(provider=provider, max_output_tokens=None), messages)
+    print()
+
+
+def diagnose_many(
+    cases: Sequence[
+        tuple[str | pathlib.Path, str | pathlib.Path | Sequence[str | pathlib.Path]]
+    ],
+    *,
+    provider: Literal["vertex", "gemini_api", "openai"] | None = None,
+    max_raw_chars: int | None = None,
+    summarize_overflow: bool = False,
+    max_output_tokens: int | None = DEFAULT_MAX_OUTPUT_TOKENS,
+    max_concurrency: int = 8,
+) -> list[str]:
+    """Diagnose several customer issues with a single batched LLM call.
+
+    Prompts are built a few cases at a time (OCR and page rendering already use
+    every CPU) and then dispatched together via the model's ``.batch()`` API, so the LLM requests run concurrently (bounded by
+    *max_concurrency* to avoid rate-limit storms) instead of back to back.
+
+    Parameters
+    ----------
+    cases : Sequence[tuple[pdf_path, raw_data_path]]
+        One ``(pdf_path, raw_data_path)`` pair per issue, with the same meaning as
+        the arguments of :func:`diagnose_customer_issue`.
+    provider, max_raw_chars, summarize_overflow, max_output_tokens
+        As for :func:`diagnose_customer_issue`; applied to every case.
+    max_concurrency : int, optional
+        Maximum number of LLM requests in flight at once.
+
+    Returns
+    -------
+    list[str]
+        One diagnosis per case, in input order.  A case whose prompt could not
+        be built (unreadable PDF, prompt over the context window, ...) or whose
+        LLM call failed yields an ``"Error running diagnosis: ..."`` message
+        instead of aborting the whole batch.
+    """
+    if not cases:
+        return []
+
+    llm = get_llm(provider=provider, max_output_tokens=max_output_tokens)
+
+    def build(case: tuple[Any, Any]) -> list[Any]:
+        pdf_path, raw_data_path = case
+        return _build_messages(
+            pdf_path,
+            raw_data_path,
+            llm,
+            provider,
+            max_raw_chars=max_raw_chars,
+            summarize_overflow=summarize_overflow,
+            max_output_tokens=max_output_tokens,
+        )
+
+    # Prompt building (PDF extraction, OCR, summarisation) dominates the cost.
+    # Overlap only a couple of builds – each already fans out across all CPUs
+    # for OCR and rendering – so one case's I/O and API waits hide another's
+    # CPU work without oversubscribing the machine.  A case that fails here is reported as an
+    # error and left out of the LLM batch rather than aborting the others.
+    responses: list[Any] = [None] * len(cases)
+    built: dict[int, list[Any]] = {}
+    build_workers = min(len(cases), max_concurrency, _MAX_CONCURRENT_BUILDS)
+    with ThreadPoolExecutor(max_workers=build_workers) as executor:
+        futures = [executor.submit(build, case) for case in cases]
+        for idx, future in enumerate(futures):
+            try:
+                built[idx] = future.result()
+            except Exception as exc:
+                responses[idx] = exc
+
+    pending = list(built)
+    if pending:
+        batch_responses = llm.batch(  # type: ignore[arg-type]
+            [built[idx] for idx in pending],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        for idx, response in zip(pending, batch_responses):
+            responses[idx] = response
+
+    empty = [
+        idx
+        for idx in pending
+        if not isinstance(responses[idx], Exception) and _is_empty_response(responses[idx])
+    ]
+    if empty and max_output_tokens is not None:
+        print(f"[LLM] {len(empty)} empty response(s) with max_output_tokens set; retrying without the cap.")
+        retries = get_llm(provider=provider, max_output_tokens=None).batch(  # type: ignore[arg-type]
+            [built[idx] for idx in empty],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        for idx, response in zip(empty, retries):
+            responses[idx] = response
+
+    results: list[str] = []
+    for idx, response in enumerate(responses, start=1):
+        if isinstance(response, Exception):
+            content = f"Error running diagnosis: {response}"
+        else:
+            content = _response_text(response)
+        print(f"\n===== LLM RESPONSE (CASE {idx}/{len(cases)}) =====\n", content, sep="")
+        results.append(content)
+
+    return results
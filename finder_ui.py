@@ -10,11 +10,54 @@ analysis.  The UI is intentionally minimal and can be expanded later.
 
 from __future__ import annotations
 
+import hashlib
 from pathlib import Path
 import tempfile
 import streamlit as st
 
-from finder import diagnose_customer_issue
+from finder import cache_dir, diagnose_customer_issue_stream
+from llm import get_llm
+
+# Uploaded files are stored content-addressed here so repeated "Diagnose"
+# clicks (and Streamlit reruns) reuse the same paths instead of re-writing them.
+_UPLOAD_DIR = cache_dir() / "uploads"
+
+
+def _persist_upload(uploaded) -> Path:
+    """Write a Streamlit upload to disk once and return its stable path.
+
+    The path is derived from a hash of the file contents, so the same upload
+    always maps to the same file and is only written the first time it is
+    seen.  Stable paths also let the content-hash PDF text cache hit.
+    """
+    data = uploaded.getbuffer()
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    path = _UPLOAD_DIR / digest / Path(uploaded.name).name
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Sessions share one process and may persist the same file concurrently,
+        # so each writer uses its own temp file; the final rename is atomic.
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False
+        ) as tmp:
+            tmp.write(data)
+        Path(tmp.name).replace(path)
+    return path
+
+
+@st.cache_resource(show_spinner=False)
+def _warm_llm() -> None:
+    """Create the default LLM client once per server process.
+
+    ``get_llm`` caches its clients, so building one at startup moves client
+    construction and credential loading out of the first "Diagnose" click.
+    Failures (e.g. missing credentials) are ignored here and surface when a
+    diagnosis actually runs.
+    """
+    try:
+        get_llm()
+    except Exception as exc:
+        print(f"[LLM] Warm-up skipped: {exc}")
 
 
 # ---------------------------------------------------------------------------
@@ -41,9 +84,12 @@ def _run_diagnosis(
     raw_paths = [Path(p.name) if hasattr(p, "name") else Path(p) for p in raw_files]
 
     try:
-        # Provider is chosen via environment variable LLM_PROVIDER (or defaults)
-        result = diagnose_customer_issue(pdf_path, raw_paths)
-        yield result
+        # Provider is chosen via environment variable LLM_PROVIDER (or defaults).
+        # Yield the accumulated answer so Gradio's Markdown updates progressively.
+        result = ""
+        for chunk in diagnose_customer_issue_stream(pdf_path, raw_paths):
+            result += chunk
+            yield result
     except Exception as exc:
         yield f"Error running diagnosis: {exc}"
 
@@ -66,6 +112,8 @@ def launch(host: str | None = None, port: int | None = None):  # noqa: D401 –
 
     st.set_page_config(page_title="Customer Issue Diagnosis")
 
+    _warm_llm()
+
     st.title("Customer Issue Diagnosis")
 
     pdf_file = st.file_uploader(
@@ -86,22 +134,12 @@ def launch(host: str | None = None, port: int | None = None):  # noqa: D401 –
             st.stop()
 
         with st.spinner("⏳ Running diagnosis – this may take a minute..."):
-            tmp_dir = Path(tempfile.mkdtemp(prefix="finder_uploads_"))
-
-            # Save uploaded PDF
-            pdf_path = tmp_dir / pdf_file.name
-            pdf_path.write_bytes(pdf_file.getbuffer())
-
-            # Save raw files
-            raw_paths: list[Path] = []
-            for rf in raw_files:
-                raw_path = tmp_dir / rf.name
-                raw_path.write_bytes(rf.getbuffer())
-                raw_paths.append(raw_path)
+            # Save uploads (no-op if already persisted)
+            pdf_path = _persist_upload(pdf_file)
+            raw_paths = [_persist_upload(rf) for rf in raw_files]
 
             try:
-                result = diagnose_customer_issue(pdf_path, raw_paths)
-                st.markdown(result)
+                st.write_stream(diagnose_customer_issue_stream(pdf_path, raw_paths))
             except Exception as exc:
                 st.error(f"Error running diagnosis: {exc}")
 
@@ -16,11 +16,116 @@ try:
 except ImportError:  # pragma: no cover – fallback if python-dotenv isn't installed
     pass
 
-from typing import Literal
+import functools
+from typing import Literal, TYPE_CHECKING
 
-from langchain_google_vertexai import ChatVertexAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
+# Provider SDKs are heavy (gRPC, protobuf, tokenizers); import them only inside
+# the helper for the provider actually in use.
+if TYPE_CHECKING:  # pragma: no cover
+    from langchain_google_vertexai import ChatVertexAI
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_openai import ChatOpenAI
+
+
+# ---------------------------------------------------------------------------
+# Response cache
+# ---------------------------------------------------------------------------
+
+
+@functools.lru_cache(maxsize=None)
+def _configure_llm_cache() -> None:
+    """Install the global LangChain response cache (once, on first use).
+
+    Identical prompts sent to the same provider/model return the cached
+    completion instead of re-hitting the API.  LangChain keys entries on the
+    serialised prompt plus the model's parameters.  A SQLite cache (persisting
+    across runs) is used when langchain-community is installed; otherwise
+    responses are cached in memory for the lifetime of the process.
+    """
+    from langchain_core.globals import set_llm_cache
+
+    try:
+        from langchain_community.cache import SQLiteCache  # type: ignore
+
+        set_llm_cache(SQLiteCache(database_path=os.getenv("FINDER_LLM_CACHE", ".finder_llm_cache.db")))
+    except Exception:  # pragma: no cover – langchain-community / SQLAlchemy missing
+        from langchain_core.caches import InMemoryCache
+
+        set_llm_cache(InMemoryCache())
+
+
+# ---------------------------------------------------------------------------
+# Output / context limits
+# ---------------------------------------------------------------------------
+
+# Decoding time scales linearly with generated tokens, so cap the output.
+DEFAULT_MAX_OUTPUT_TOKENS = 800
+
+# Prompt budget (tokens) by model-name prefix, checked in order; override with
+# ``LLM_CONTEXT_TOKENS`` when using a model not listed here.
+_CONTEXT_TOKENS_BY_MODEL = (
+    ("chat-bison", 8_192),
+    ("gemini", 1_048_576),
+    ("gpt-4o", 128_000),
+)
+_DEFAULT_CONTEXT_TOKENS = 128_000
+
+
+def _resolve_provider(provider: str | None) -> str:
+    """Return *provider* or the ``LLM_PROVIDER`` default (Vertex AI)."""
+    return (provider or os.getenv("LLM_PROVIDER", "vertex")).lower()
+
+
+def _model_name(provider: str, size: Literal["small", "large"] = "large") -> str:
+    """Return the model name configured for *provider* / *size* via env vars."""
+    if provider == "openai":
+        if size == "small":
+            return os.getenv("OPENAI_SMALL_MODEL", "gpt-4o-mini")
+        return os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    if size == "small":
+        return os.getenv("GEMINI_SMALL_MODEL", "gemini-2.5-flash")
+    if provider == "gemini_api":
+        return os.getenv("GEMINI_MODEL", "gemini-2p5-flash")
+    # Vertex AI
+    return os.getenv("GEMINI_MODEL", "chat-bison@001")
+
+
+def context_window(
+    provider: Literal["vertex", "gemini_api", "openai"] | None = None,
+    size: Literal["small", "large"] = "large",
+) -> int:
+    """Return the maximum prompt size in tokens for the model *provider* resolves to."""
+    override = os.getenv("LLM_CONTEXT_TOKENS")
+    if override:
+        return int(override)
+    model = _model_name(_resolve_provider(provider), size)
+    for prefix, tokens in _CONTEXT_TOKENS_BY_MODEL:
+        if model.startswith(prefix):
+            return tokens
+    return _DEFAULT_CONTEXT_TOKENS
+
+
+def count_tokens(text: str) -> int | None:
+    """Return an approximate token count for *text* (``cl100k_base``).
+
+    Returns ``None`` if *tiktoken* isn't available.  The count is exact for
+    OpenAI models and a close-enough estimate for Gemini.
+    """
+    encoding = _token_encoding()
+    if encoding is None:
+        return None
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@functools.lru_cache(maxsize=None)
+def _token_encoding():  # type: ignore[no-untyped-def]
+    """Return the cached ``cl100k_base`` encoding, or ``None`` if unavailable."""
+    try:
+        import tiktoken  # type: ignore
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # pragma: no cover – tiktoken missing / encoding download failed
+        return None
 
 
 # ---------------------------------------------------------------------------
@@ -28,40 +133,56 @@ from langchain_openai import ChatOpenAI
 # ---------------------------------------------------------------------------
 
 
-def _vertex_llm() -> ChatVertexAI:
+def _vertex_llm(
+    model: str,
+    max_output_tokens: int | None = DEFAULT_MAX_OUTPUT_TOKENS,
+) -> ChatVertexAI:
     """Return a Vertex AI chat model (Bison / Gemini-2.5)."""
+    from langchain_google_vertexai import ChatVertexAI
+
     return ChatVertexAI(
         project=os.environ["GOOGLE_CLOUD_PROJECT"],
         location="us-central1",
-        model_name=os.getenv("GEMINI_MODEL", "chat-bison@001"),
+        model_name=model,
         temperature=0.3,
-        max_output_tokens=1024,
+        max_output_tokens=max_output_tokens,
     )
 
 
-def _gemini_api_llm() -> ChatGoogleGenerativeAI:
+def _gemini_api_llm(
+    model: str,
+    max_output_tokens: int | None = DEFAULT_MAX_OUTPUT_TOKENS,
+) -> ChatGoogleGenerativeAI:
     """Return a Gemini model instantiated via the public Google AI Studio API key.
 
     NOTE: The Gemini API currently returns **empty content** (finish_reason = MAX_TOKENS
     with output_tokens = 0) if ``max_output_tokens`` is supplied and the model hits
     that limit – even if the limit is well below the model's actual maximum.
-    To avoid this bug we **omit** the parameter entirely, letting the backend decide
-    an appropriate value.
+    Callers work around this by retrying once with ``max_output_tokens=None``
+    (see ``finder``) when a capped call comes back empty.
     """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
     return ChatGoogleGenerativeAI(
-        model=os.getenv("GEMINI_MODEL", "gemini-2p5-flash"),
+        model=model,
         google_api_key=os.environ["GEMINI_API_KEY"],
         temperature=0.3,
+        max_output_tokens=max_output_tokens,
     )
 
 
-def _openai_llm() -> ChatOpenAI:
+def _openai_llm(
+    model: str,
+    max_output_tokens: int | None = DEFAULT_MAX_OUTPUT_TOKENS,
+) -> ChatOpenAI:
     """Return an OpenAI GPT-4o (or 4o-mini) chat model instance."""
+    from langchain_openai import ChatOpenAI
+
     return ChatOpenAI(
-        model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        model=model,
         api_key=os.environ["OPENAI_API_KEY"],
         temperature=0.3,
-        max_tokens=1024,
+        max_tokens=max_output_tokens,
     )
 
 
@@ -72,6 +193,8 @@ def _openai_llm() -> ChatOpenAI:
 
 def get_llm(
     provider: Literal["vertex", "gemini_api", "openai"] | None = None,
+    size: Literal["small", "large"] = "large",
+    max_output_tokens: int | None = DEFAULT_MAX_OUTPUT_TOKENS,
 ):
     """Return a LangChain chat model based on runtime configuration.
 
@@ -84,18 +207,41 @@ def get_llm(
     ----------
     provider : Literal["vertex", "gemini_api", "openai"] | None
         Provider override. If ``None`` (default) follow env vars / defaults.
+    size : Literal["small", "large"]
+        ``"large"`` (default) for the main diagnosis; ``"small"`` selects a cheaper,
+        faster model (``*_SMALL_MODEL`` env vars) for preprocessing such as
+        summarisation.
+    max_output_tokens : int | None
+        Cap on generated tokens, applied consistently across providers.  ``None``
+        leaves the limit to the backend.
+
+    Clients are cached per ``(provider, model, max_output_tokens)``, with the
+    model name re-read from the environment on every call, so repeated calls
+    reuse the same instance – and its HTTP connection pool / auth token –
+    instead of paying the TLS handshake and credential fetch again.
     """
-    provider = provider or os.getenv("LLM_PROVIDER", "vertex").lower()  # type: ignore
+    provider = _resolve_provider(provider)  # type: ignore[assignment]
 
     # Emit a short debug line so users can verify which backend is selected.
-    print(f"[LLM] Using provider: {provider}")
+    model = _model_name(provider, size)
+    print(f"[LLM] Using provider: {provider} ({size}: {model})")
+
+    return _cached_llm(provider, model, max_output_tokens)
+
+
+# Room for the large and small models, each capped and uncapped (for the
+# empty-response retry), plus the summary buckets – without unbounded growth.
+@functools.lru_cache(maxsize=8)
+def _cached_llm(provider: str, model: str, max_output_tokens: int | None):
+    """Instantiate (once per argument combination) the chat model for :func:`get_llm`."""
+    _configure_llm_cache()
 
     if provider == "gemini_api":
-        return _gemini_api_llm()
+        return _gemini_api_llm(model, max_output_tokens)
     if provider == "openai":
-        return _openai_llm()
+        return _openai_llm(model, max_output_tokens)
     # fallback → Vertex AI
-    return _vertex_llm()
+    return _vertex_llm(model, max_output_tokens)
 
 
-__all__ = ["get_llm"]
+__all__ = ["DEFAULT_MAX_OUTPUT_TOKENS", "context_window", "count_tokens", "get_llm"]